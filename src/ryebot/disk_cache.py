@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import tempfile
+import time
+
+try:
+    # much faster than the json module, which matters for large data
+    import orjson
+except ImportError:
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def cache_directory() -> Path:
+    """Return the directory for files that are kept between script runs."""
+    cache_directory: Path = {
+        'Windows': Path(os.getenv('LOCALAPPDATA', Path.home())),
+        'Linux': Path.home() / '.cache',
+        'Darwin': Path.home() / 'Library' / 'Caches'  # macOS
+    }.get(platform.system(), Path.home())
+    return cache_directory / __package__
+
+
+def read_cache(name: str, max_age: float = None):
+    """Return the JSON data stored under the `name`, or `None` if there is none.
+
+    If `max_age` (in seconds) is given, then data that is older than that is
+    treated as missing.
+    """
+    cache_file = cache_directory() / f'{name}.json'
+    try:
+        if max_age is not None and time.time() - cache_file.stat().st_mtime > max_age:
+            return None
+        if orjson is not None:
+            return orjson.loads(cache_file.read_bytes())
+        with open(cache_file, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.debug(f'Reading the cache file "{cache_file}" failed:', exc_info=True)
+        return None
+
+
+def write_cache(name: str, data):
+    """Store the `data` as JSON under the `name`, replacing any existing data.
+
+    Failing to write the cache is not an error, it is only logged.
+    """
+    cache_file = cache_directory() / f'{name}.json'
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that the cache file is never incomplete
+        if orjson is not None:
+            data_bytes = orjson.dumps(data)
+        else:
+            data_bytes = json.dumps(data).encode('utf-8')
+        with tempfile.NamedTemporaryFile(
+            'wb', dir=cache_file.parent, delete=False
+        ) as f:
+            f.write(data_bytes)
+        os.replace(f.name, cache_file)
+    except Exception:
+        logger.debug(f'Writing the cache file "{cache_file}" failed:', exc_info=True)
+
+
+def delete_cache(name: str):
+    """Remove the data stored under the `name`, if there is any."""
+    cache_file = cache_directory() / f'{name}.json'
+    try:
+        cache_file.unlink(missing_ok=True)
+    except Exception:
+        logger.debug(f'Deleting the cache file "{cache_file}" failed:', exc_info=True)
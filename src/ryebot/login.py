@@ -4,6 +4,8 @@ import logging
 from pprint import pformat
 
 from custom_mwclient import WikiAuth, WikiggClient
+import requests
+from requests.adapters import HTTPAdapter
 
 from ryebot.errors import LoginError
 
@@ -15,6 +17,17 @@ USER_AGENT = (
     'https://terraria.wiki.gg/wiki/User_talk:Ryebot)'
 )
 
+# all wikis are on the same host, so the connections are pooled across all of
+# them to avoid a new TCP and TLS handshake for each login and request.
+# retrying is left to mwclient and `rate_limiter.retry_with_backoff`, so the
+# adapter itself must not retry, otherwise the retries would multiply
+_shared_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=0,
+    pool_block=False
+)
+
 
 def login(targetwiki: str = 'terraria'):
     """Login to the `targetwiki` and return the `WikiggClient` object."""
@@ -23,7 +36,8 @@ def login(targetwiki: str = 'terraria'):
     kwargs = {
         'wikiname': targetwiki,
         'credentials': wiki_auth,
-        'clients_useragent': USER_AGENT
+        'clients_useragent': USER_AGENT,
+        'pool': _make_session()
     }
     if '/' in targetwiki:
         kwargs['wikiname'], kwargs['lang'] = targetwiki.split('/', maxsplit=1)
@@ -66,3 +80,16 @@ def login(targetwiki: str = 'terraria'):
     logger.debug(pformat(vars(site_for_log)))
 
     return site
+
+
+def _make_session():
+    """Create a new `requests.Session` that uses the shared connection pool.
+
+    Each site needs its own session to keep its login cookies separate.
+    """
+    session = requests.Session()
+    session.mount('https://', _shared_adapter)
+    session.mount('http://', _shared_adapter)
+    # mwclient only sets the user agent on sessions it creates itself
+    session.headers['User-Agent'] = USER_AGENT
+    return session
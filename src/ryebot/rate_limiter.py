@@ -0,0 +1,163 @@
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import functools
+import logging
+import random
+import threading
+import time
+
+from mwclient.errors import InvalidResponse
+import requests
+
+from ryebot.errors import ScriptRuntimeError
+
+
+logger = logging.getLogger(__name__)
+
+_limiters: 'dict[str, SlidingWindow]' = {}
+_limiters_lock = threading.Lock()
+
+# once set, all current and future waits end immediately
+_waiting_cancelled = threading.Event()
+
+# strings that only appear in the HTML of a Cloudflare challenge page
+CLOUDFLARE_CHALLENGE_MARKERS = ('cf-challenge', 'challenge-platform', '<title>Just a moment...</title>')
+
+
+class SlidingWindow():
+    """Limits the rate of requests to at most `limit` in any `period` seconds.
+
+    A request is only delayed if there already were `limit` requests in the
+    `period` seconds before it, so short bursts are not slowed down at all.
+    Safe to use from multiple threads.
+
+    >>> window = SlidingWindow(limit=55, period=60)
+    >>> window.acquire()  # returns immediately while there is budget left
+    """
+
+    def __init__(self, limit: int = 55, period: float = 60):
+        self.limit = limit
+        self.period = period
+        # times of the last `limit` requests, oldest first
+        self._request_times: 'deque[float]' = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Record one request, waiting until it is within the limit if necessary."""
+        # no more requests once waiting is cancelled, even if they could be
+        # made right away
+        _raise_if_cancelled()
+        with self._lock:
+            now = time.monotonic()
+            if len(self._request_times) < self.limit:
+                request_time = now
+            else:
+                # the request may only be made once the oldest of the last
+                # `limit` requests has left the window
+                request_time = max(now, self._request_times.popleft() + self.period)
+            # the request is recorded right away with the time at which it will
+            # be made, so that concurrent callers queue up behind each other
+            # instead of all waking up at the same time
+            self._request_times.append(request_time)
+        delay = request_time - now
+        if delay > 0:
+            logger.debug("Rate limit reached, waiting %.1f sec", delay)
+            _wait(delay)
+
+
+def limiter_for_host(host: str) -> SlidingWindow:
+    """Return the `SlidingWindow` shared by all requests to the `host`."""
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = SlidingWindow()
+        return _limiters[host]
+
+
+def retry_with_backoff(retries: int = 5, base: float = 2.0):
+    """Decorator that retries the function when the server throttles the request.
+
+    A request counts as throttled if it fails with HTTP status 429 or returns a
+    Cloudflare challenge page. Before each retry, wait as long as requested by
+    the server's "Retry-After" header, or otherwise `base * 2**attempt` seconds
+    plus a random jitter of up to `base` seconds. All other errors, and the
+    error of the last retry, are raised as usual.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except (requests.HTTPError, InvalidResponse) as exc:
+                    if attempt == retries or not _is_throttled(exc):
+                        raise
+                    delay = _retry_after(exc)
+                    if delay is None:
+                        delay = base * 2 ** attempt + random.uniform(0, base)
+                    logger.info(
+                        f"Request was throttled, retrying in {delay:.1f} sec "
+                        f"(retry {attempt + 1} of {retries})."
+                    )
+                    _wait(delay)
+        return wrapper
+    return decorator
+
+
+def cancel_waiting():
+    """End all current and future waits of the rate limiter with a `ScriptRuntimeError`.
+
+    Only sets an event, so it is safe to call from a signal handler.
+    """
+    _waiting_cancelled.set()
+
+
+def reset_waiting():
+    """Undo `cancel_waiting`, so that a new script run is not cancelled from the start."""
+    _waiting_cancelled.clear()
+
+
+def _wait(delay: float):
+    """Sleep for `delay` seconds, unless waiting is cancelled by `cancel_waiting`."""
+    _waiting_cancelled.wait(delay)
+    _raise_if_cancelled()
+
+
+def _raise_if_cancelled():
+    """Raise a `ScriptRuntimeError` if waiting is cancelled by `cancel_waiting`."""
+    if _waiting_cancelled.is_set():
+        logger.info("Waiting for the rate limit was cancelled.")
+        raise ScriptRuntimeError("Cancelled while waiting for the rate limit.")
+
+
+def _is_throttled(exc: Exception):
+    """Check if the `exc` was caused by the server throttling the request."""
+    if isinstance(exc, InvalidResponse):
+        response_text = exc.response_text
+    elif exc.response is not None:
+        if exc.response.status_code == 429:
+            return True
+        response_text = exc.response.text
+    else:
+        return False
+    return any(marker in (response_text or '') for marker in CLOUDFLARE_CHALLENGE_MARKERS)
+
+
+def _retry_after(exc: Exception):
+    """Return the delay in seconds from the "Retry-After" header of the response, if any."""
+    response = getattr(exc, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    # the value is either a number of seconds or an HTTP date
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_time = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_time - datetime.now(tz=timezone.utc)).total_seconds())
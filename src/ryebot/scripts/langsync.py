@@ -1,16 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
 import copy
-import math
+import functools
 import logging
+import re
 import time
 
 from custom_mwclient import WikiClient
-from mwclient.errors import InvalidPageTitle, ProtectedPageError, APIError
+from mwclient.errors import ProtectedPageError, APIError
 from mwclient.page import Page
-from requests.exceptions import HTTPError
 
 from ryebot.bot import Bot
-from ryebot.errors import LoginError, ScriptRuntimeError
+from ryebot.disk_cache import read_cache, write_cache
+from ryebot.errors import LoginError
 from ryebot.login import login
+from ryebot.rate_limiter import limiter_for_host
 from ryebot.script_configuration import ScriptConfiguration
 from ryebot.stopwatch import Stopwatch
 
@@ -32,6 +35,18 @@ DEFAULT_CONFIG = {
 # https://developers.cloudflare.com/firewall/cf-firewall-rules/cloudflare-challenges/#detecting-a-challenge-page-response
 CLOUDFLARE_SAFETY_DELAY: float = 15  # in seconds
 
+SUMMARY_PREFIX = "[[:en:User:Ryebot/bot/scripts/langsync|sync]] :: en revid:"
+
+# The list of valid wikis rarely changes, so it is only fetched again from the
+# wiki if the cached one is older than this.
+OFFWIKI_LIST_CACHE_MAX_AGE: float = 60 * 60  # in seconds
+
+# Number of wikis that are prepared for the sync (logging in and finding out
+# which pages need a sync) simultaneously. They are all served by the same host,
+# so their requests share the request budget of that host (see
+# `rate_limiter.limiter_for_host`). The saves are always made one after the other.
+MAX_PARALLEL_WIKIS: int = 3
+
 
 def script_main():
     logger.info("Started langsync.")
@@ -51,39 +66,81 @@ def script_main():
     # get pages from category config
     pages_base = _get_pages_from_category_cfg(config["categories"])
 
-    # get pages from page config
-    pages_base |= _get_pages_from_page_cfg(config["pages"])
+    # get pages from page config (the ones from the categories are already fetched)
+    titles_base = {pageinfo['title_en'] for pageinfo in pages_base.values()}
+    pages_base |= _get_pages_from_page_cfg(config["pages"], titles_base)
 
     pagenames_for_log = [pages_base[pageid]['title_en'] for pageid in pages_base.keys()]
     logger.info(f"Pages to sync (base): {sorted(pagenames_for_log)}")
 
+    # the syncalso pages of all wikis are looked up at once, and only the ones
+    # that are not among the base pages already need to have their content fetched
+    syncalso_from_config = {
+        wiki: _str_to_set(config.get(f'{wiki}:syncalso', ''), ';')
+        for wiki in wikis
+    }
+    syncalso_titles = _normalize_page_titles(list(set().union(*syncalso_from_config.values())))
+    pages_syncalso = pages_base | _get_info_for_titles([
+        normalized_title['title'] for normalized_title in syncalso_titles.values()
+        if normalized_title and normalized_title['id'] not in pages_base
+    ])
+
+    # the syncnot titles mostly match the titles of the base pages already, so
+    # they can be resolved without asking the wiki; the others (and all titles that
+    # can't be normalized locally) are looked up at once
+    syncnot_from_config = {
+        wiki: _str_to_set(config.get(f'{wiki}:syncnot', ''), ';')
+        for wiki in wikis
+    }
+    pageids_base = {pageinfo['title_en']: pageid for pageid, pageinfo in pages_base.items()}
+    syncnot_pageids_by_title = {}
+    syncnot_titles_to_normalize = []
+    for title in set().union(*syncnot_from_config.values()):
+        pageid = pageids_base.get(_normalize_title_locally(title))
+        if pageid:
+            syncnot_pageids_by_title[title] = pageid
+        else:
+            syncnot_titles_to_normalize.append(title)
+    for title, normalized_title in _normalize_page_titles(syncnot_titles_to_normalize).items():
+        if normalized_title:
+            syncnot_pageids_by_title[title] = normalized_title['id']
+
     # handle language-specific config
     pages: dict[str, dict[str, dict]] = {}  # key: wiki language, value: page dicts
     pageorders: dict[str, list[str]] = {}  # key: wiki language, value: page IDs
     for wiki in wikis:
-        pages[wiki] = copy.deepcopy(pages_base)
-
-        # syncnot
-        syncnot_from_config = list(_str_to_set(config.get(f'{wiki}:syncnot', ''), ';'))
-        syncnot_pageids = set(_pagetitles_to_ids(syncnot_from_config))
-        current_pageids = set(pages[wiki].keys())
-        for pageid_to_remove in current_pageids & syncnot_pageids:
-            del pages[wiki][pageid_to_remove]
+        # syncnot (pages to skip are not copied in the first place)
+        syncnot_pageids = {
+            syncnot_pageids_by_title[title] for title in syncnot_from_config[wiki]
+            if title in syncnot_pageids_by_title
+        }
+        pages[wiki] = {
+            pageid: copy.deepcopy(pageinfo)
+            for pageid, pageinfo in pages_base.items()
+            if pageid not in syncnot_pageids
+        }
 
         # syncalso
-        syncalso_from_config = list(_str_to_set(config.get(f'{wiki}:syncalso', ''), ';'))
-        pages[wiki] |= _get_info_for_titles(syncalso_from_config)
-
-        # lang targetpages
+        for title in syncalso_from_config[wiki]:
+            pageid = syncalso_titles[title].get('id')
+            if pageid in pages_syncalso:
+                pages[wiki][pageid] = copy.deepcopy(pages_syncalso[pageid])
+
+        # lang targetpages; collect all "<wiki>:<title>" config keys of this wiki first
+        config_prefix = f'{wiki}:'
+        targetpages_from_config = {
+            key[len(config_prefix):]: value for key, value in config.items()
+            if key.startswith(config_prefix)
+        }
         for pageid, pageinfo in pages[wiki].items():
             # default to EN if the targetpage is not set in the config
-            pageinfo['title_lang'] = config.get(f'{wiki}:{pageinfo["title_en"]}', pageinfo["title_en"])
+            pageinfo['title_lang'] = targetpages_from_config.get(pageinfo["title_en"], pageinfo["title_en"])
 
         pageorders[wiki] = sorted(pages[wiki].keys(), key=lambda pageid: pages[wiki][pageid]['title_en'])
         pagenames_for_log = [pages[wiki][pageid]['title_en'] for pageid in pageorders[wiki]]
         logger.info(f"Pages to sync ({wiki}) ({len(pages[wiki])}): {pagenames_for_log}")
 
-    if sum([len(wiki) for wiki in pages.values()]) == 0:
+    if not any(pages.values()):
         logger.info(
             "Didn't retrieve any information about pages to sync. Terminated "
             "with no changes."
@@ -91,256 +148,372 @@ def script_main():
         return
 
     # ------------- Save pages on langwikis -------------
+    # preparing the wikis only reads from them, so several of them are prepared
+    # at once. the saves are spaced out by the `CLOUDFLARE_SAFETY_DELAY` anyway,
+    # so they are made for one wiki after the other
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_WIKIS, len(wikis))) as executor:
+        prepared_wikis = dict(zip(
+            wikis, executor.map(_prepare_wiki, wikis, [pages[wiki] for wiki in wikis])
+        ))
     saveresults: dict[str, list[tuple[str, dict, Stopwatch]]] = {}
     for wiki in wikis:
         logger.info('+' * 40 + ' ' + wiki.upper())
-        try:
-            site = login("terraria/" + wiki)
-        except LoginError:
-            logger.exception(
-                f"Skipped {wiki.upper()} because logging in to it failed:",
-                extra = {
-                    "head": f"Couldn't sync any pages to {wiki.upper()}!",
-                    "body": f"Logging in to {wiki.upper()} failed."
-                }
-            )
-            continue
-        Bot.other_sites[wiki] = site
-
-        titles_lang = [p['title_lang'] for p in pages[wiki].values()]
-        normalized_titles = _normalize_page_titles(titles_lang, site)
-
-        # fetch the texts of the pages on this wiki
-        langpages_info = _get_info_for_titles(titles_lang, site)
-        for pageid, pagedata in pages[wiki].items():
-            normalized_title = normalized_titles[pagedata['title_lang']]
-            pagedata['title_lang_normalized'] = normalized_title.get('title', pagedata['title_lang'])
-            langpage_info = langpages_info.get(normalized_title.get('id'))
-            if langpage_info:
-                pagedata['text_lang'] = langpage_info['text']
-            pagedata['needs_sync'] = pagedata['text'] != pagedata.get('text_lang')
-
-        total = len(pages[wiki])
-        w = math.ceil(math.log10(total))  # greatest number of digits, for formatting
-
-        for i, pageid in enumerate(pageorders[wiki]):
-            page = pages[wiki][pageid]
-            sourcepage_name = page['title_en']
-            targetpage_name = page['title_lang_normalized']
-            targetpage_for_log = sourcepage_name
-            if targetpage_name != sourcepage_name:
-                targetpage_for_log += f" -> {targetpage_name}"
-            logger.info(f"{i+1: {w}}/{total}: {targetpage_for_log}")
-
-            if not pages[wiki][pageid]['needs_sync']:
-                continue
+        if prepared_wikis[wiki] is None:
+            continue  # logging in failed
+        site, targetpages = prepared_wikis[wiki]
+        saveresults_for_wiki = _sync_one_wiki(
+            wiki, site, pages[wiki], pageorders[wiki], targetpages
+        )
+        if saveresults_for_wiki:
+            saveresults[wiki] = saveresults_for_wiki
+
+    logger.info("Completed syncing to all wikis.")
+    Bot.script_output = format_saveresults(saveresults)
+
+
+def _prepare_wiki(wiki: str, pages_for_wiki: dict[str, dict]) -> 'tuple[WikiClient, dict[str, Page]] | None':
+    """Log in to the `wiki` and find out which of the `pages_for_wiki` need a sync.
+
+    Add the normalized title on the `wiki` and whether the page needs a sync to
+    each of the `pages_for_wiki`. Return the site and the `Page` objects of the
+    pages that need a sync, or `None` if logging in failed. Only reads from the
+    `wiki`, so it is safe to run for several wikis at once.
+    """
+    try:
+        site = login("terraria/" + wiki)
+    except LoginError:
+        logger.exception(
+            f"Skipped {wiki.upper()} because logging in to it failed:",
+            extra = {
+                "head": f"Couldn't sync any pages to {wiki.upper()}!",
+                "body": f"Logging in to {wiki.upper()} failed."
+            }
+        )
+        return None
+    Bot.other_sites[wiki] = site
+
+    titles_lang = [p['title_lang'] for p in pages_for_wiki.values()]
+
+    # fetch the hashes of the pages on this wiki; comparing them to the hashes
+    # of the English pages means that the texts don't need to be downloaded
+    langpages_info = _get_info_for_titles(titles_lang, site, fetch_text=False)
+
+    # pages without a language-specific title in the config mostly have the
+    # same title on this wiki, so we can take their ID straight from the
+    # fetched page info. only the other titles (and the ones that weren't
+    # found like that, e.g. due to a localized namespace) are normalized
+    langpage_ids = {info['title_en']: pageid for pageid, info in langpages_info.items()}
+    normalized_titles = {}
+    titles_to_normalize = []
+    for pagedata in pages_for_wiki.values():
+        title_lang = pagedata['title_lang']
+        if title_lang == pagedata['title_en'] and title_lang in langpage_ids:
+            normalized_titles[title_lang] = {'id': langpage_ids[title_lang], 'title': title_lang}
+        else:
+            titles_to_normalize.append(title_lang)
+    if titles_to_normalize:
+        normalized_titles |= _normalize_page_titles(titles_to_normalize, site)
+
+    for pageid, pagedata in pages_for_wiki.items():
+        normalized_title = normalized_titles[pagedata['title_lang']]
+        pagedata['title_lang_normalized'] = normalized_title.get('title', pagedata['title_lang'])
+        langpage_info = langpages_info.get(normalized_title.get('id'))
+        if langpage_info:
+            pagedata['sha1_lang'] = langpage_info['sha1']
+        pagedata['needs_sync'] = (
+            pagedata['sha1'] is None  # hash is unavailable, e.g. if the revision is hidden
+            or pagedata['sha1'] != pagedata.get('sha1_lang')
+        )
+
+    # fetch the info about all target pages at once instead of one by one
+    targetpages = _get_pages_for_titles(
+        [p['title_lang_normalized'] for p in pages_for_wiki.values() if p['needs_sync']],
+        site
+    )
+    return site, targetpages
+
+
+def _sync_one_wiki(
+    wiki: str,
+    site: WikiClient,
+    pages_for_wiki: dict[str, dict],
+    pageorder: list[str],
+    targetpages: dict[str, Page]
+):
+    """Sync the pages to the `wiki` and return the results of all saves.
 
-            summary = Bot.summary(
-                f"[[:en:User:Ryebot/bot/scripts/langsync|sync]] :: en "
-                f"revid:{page['revid']}::"
+    The `wiki` has to be prepared with `_prepare_wiki` first.
+    """
+    saveresults: list[tuple[str, dict, Stopwatch]] = []
+    total = len(pages_for_wiki)
+    w = len(str(total))  # greatest number of digits, for formatting
+
+    save_function = _simulate_save_page if Bot.dry_run else _save_page
+
+    for i, pageid in enumerate(pageorder):
+        page = pages_for_wiki[pageid]
+        progress = f"{i+1: {w}}/{total}"
+        targetpage = targetpages.get(page['title_lang_normalized'])
+        saveresult_tuple = _sync_one_page(site, wiki, page, targetpage, save_function, progress)
+        if saveresult_tuple is not None:
+            saveresults.append(saveresult_tuple)
+    return saveresults
+
+
+def _sync_one_page(site: WikiClient, wiki: str, page: dict, targetpage: Page, save_function, progress: str):
+    """Save the `page` to the `wiki` and return the result, or `None` if it wasn't saved.
+
+    The `targetpage` is fetched from the wiki if it is `None`. The actual saving
+    is done by the `save_function`, see `_save_page` and `_simulate_save_page`.
+    The `progress` is the prefix for the log line about the page.
+    """
+    sourcepage_name = page['title_en']
+    targetpage_name = page['title_lang_normalized']
+    targetpage_for_log = sourcepage_name
+    if targetpage_name != sourcepage_name:
+        targetpage_for_log += f" -> {targetpage_name}"
+    logger.info(f"{progress}: {targetpage_for_log}")
+
+    if not page['needs_sync']:
+        return None
+
+    # fetch the page from the target wiki
+    try:
+        if targetpage is None:
+            limiter_for_host(site.host).acquire()
+            targetpage = site.pages[targetpage_name]
+    except Exception:
+        logger.exception(f'Error while reading "{targetpage_name}" on {wiki}:')
+        logger.warning(
+            "Skipped page due to error.",
+            extra = {
+                "head": f'Did not sync "{wiki}:{targetpage_name}"',
+                "body": (
+                    f"Couldn't read the page on {wiki} due to some error; "
+                    "check the logs for details."
+                )
+            }
+        )
+        return None
+    return save_function(site, wiki, page, targetpage)
+
+
+def _simulate_save_page(site: WikiClient, wiki: str, page: dict, targetpage: Page):
+    """Log what `_save_page` would do, without saving anything."""
+    pagetext = page['text']
+    summary = _summary_for_revid(page['revid'])
+    chardiff = len(pagetext) - (targetpage.length or 0)
+    chardiff_str = '+' if chardiff > 0 else ''
+    chardiff_str += f"{chardiff} diff"
+    logger.info(
+        f'Would save page "{targetpage.name}" on {wiki} '
+        f"({len(pagetext)} characters, {chardiff_str}) with "
+        f'summary "{summary}".'
+    )
+
+
+def _save_page(site: WikiClient, wiki: str, page: dict, targetpage: Page):
+    """Save the `page` to the `targetpage` and return the result, or `None` if it wasn't saved."""
+    sourcepage_name = page['title_en']
+    pagetext = page['text']
+    summary = _summary_for_revid(page['revid'])
+
+    logger.debug("Sleeping to avoid Cloudflare challenge: %d sec", CLOUDFLARE_SAFETY_DELAY)
+    time.sleep(CLOUDFLARE_SAFETY_DELAY)
+    limiter_for_host(site.host).acquire()
+    didntsave_text = f'Did not sync "{wiki}:{targetpage.name}"'
+
+    stopwatch = Stopwatch()
+    saveresult = None
+    try:
+        saveresult = site.save(targetpage, pagetext, summary=summary, minor=True)
+    except ProtectedPageError:
+        logger.warning(
+            "Page is protected, skipped it.",
+            extra = {
+                "head": didntsave_text,
+                "body": "Couldn't save the page because it is protected."
+            }
+        )
+    except APIError as error:
+        logger.exception("Error while saving:")
+        if (
+            not targetpage.exists
+            and targetpage.contentmodel == "Scribunto"
+            and page["contentmodel"] == "wikitext"
+            and error.code == "scribunto-lua-error-location"
+        ):
+            # targetpage is a non-existent "Module:" page but the
+            # content is wikitext (most likely: documentation page
+            # of a module), which throws a Lua error.
+            # retry the page creation with forcing the contentmodel
+            # to wikitext.
+            logger.info(
+                'Re-trying to create this "Module:" page by forcing '
+                'the content model to "wikitext".'
             )
 
-            # fetch the page from the target wiki
+            limiter_for_host(site.host).acquire()
+            # restart the save timer
+            stopwatch.restart()
             try:
-                targetpage = site.pages[targetpage_name]
+                saveresult = site.save(targetpage, pagetext, summary=summary, minor=True, contentmodel="wikitext")
             except Exception:
-                logger.exception(f'Error while reading "{targetpage_name}" on {wiki}:')
+                logger.exception("Error while saving:")
                 logger.warning(
                     "Skipped page due to error.",
                     extra = {
-                        "head": f'Did not sync "{wiki}:{targetpage_name}"',
+                        "head": didntsave_text,
                         "body": (
-                            f"Couldn't read the page on {wiki} due to some error; "
+                            "Couldn't save the page due to some error; "
                             "check the logs for details."
                         )
                     }
                 )
-                continue
-            logger.debug(f"Sleeping to avoid Cloudflare challenge: {CLOUDFLARE_SAFETY_DELAY} sec")
-            time.sleep(CLOUDFLARE_SAFETY_DELAY)
-            didntsave_text = f'Did not sync "{wiki}:{targetpage.name}"'
-
-            pagetext = page['text']
-
-            if Bot.dry_run:
-                chardiff = len(pagetext) - (targetpage.length or 0)
-                chardiff_str = '+' if chardiff > 0 else ''
-                chardiff_str += f"{chardiff} diff"
-                logger.info(
-                    f'Would save page "{targetpage.name}" on {wiki} '
-                    f"({len(pagetext)} characters, {chardiff_str}) with "
-                    f'summary "{summary}".'
-                )
             else:
-                stopwatch = Stopwatch()
-                saveresult = None
-                try:
-                    saveresult = site.save(targetpage, pagetext, summary=summary, minor=True)
-                except ProtectedPageError:
-                    logger.warning(
-                        "Page is protected, skipped it.",
-                        extra = {
-                            "head": didntsave_text,
-                            "body": "Couldn't save the page because it is protected."
-                        }
-                    )
-                except APIError as error:
-                    logger.exception("Error while saving:")
-                    if (
-                        not targetpage.exists
-                        and targetpage.contentmodel == "Scribunto"
-                        and page["contentmodel"] == "wikitext"
-                        and error.code == "scribunto-lua-error-location"
-                    ):
-                        # targetpage is a non-existent "Module:" page but the
-                        # content is wikitext (most likely: documentation page
-                        # of a module), which throws a Lua error.
-                        # retry the page creation with forcing the contentmodel
-                        # to wikitext.
-                        logger.info(
-                            'Re-trying to create this "Module:" page by forcing '
-                            'the content model to "wikitext".'
-                        )
-
-                        # restart the save timer
-                        stopwatch.stop()
-                        stopwatch.start()
-                        try:
-                            saveresult = site.save(targetpage, pagetext, summary=summary, minor=True, contentmodel="wikitext")
-                        except Exception:
-                            logger.exception("Error while saving:")
-                            logger.warning(
-                                "Skipped page due to error.",
-                                extra = {
-                                    "head": didntsave_text,
-                                    "body": (
-                                        "Couldn't save the page due to some error; "
-                                        "check the logs for details."
-                                    )
-                                }
-                            )
-                        else:
-                            logger.warning(
-                                (
-                                    f'Created "{wiki}:{targetpage.name}" with a '
-                                    'forced contentmodel of "wikitext".'
-                                ),
-                                extra = {
-                                    "head": f'Possibly created "{wiki}:{targetpage.name}" incorrectly',
-                                    "body": (
-                                        "Creating the page normally caused a Lua "
-                                        "error, so it was created with a forced "
-                                        'content model of "wikitext". This might '
-                                        'be wrong as the page is in the "Module:" '
-                                        "namespace. Please check it manually to "
-                                        "ensure everything is in order."
-                                    )
-                                }
-                            )
-                    else:
-                        logger.warning(
-                            "Skipped page due to error.",
-                            extra = {
-                                "head": didntsave_text,
-                                "body": (
-                                    "Couldn't save the page due to some error; "
-                                    "check the logs for details."
-                                )
-                            }
+                logger.warning(
+                    (
+                        f'Created "{wiki}:{targetpage.name}" with a '
+                        'forced contentmodel of "wikitext".'
+                    ),
+                    extra = {
+                        "head": f'Possibly created "{wiki}:{targetpage.name}" incorrectly',
+                        "body": (
+                            "Creating the page normally caused a Lua "
+                            "error, so it was created with a forced "
+                            'content model of "wikitext". This might '
+                            'be wrong as the page is in the "Module:" '
+                            "namespace. Please check it manually to "
+                            "ensure everything is in order."
                         )
-                except Exception:
-                    logger.exception("Error while saving:")
-                    logger.warning(
-                        "Skipped page due to error.",
-                        extra = {
-                            "head": didntsave_text,
-                            "body": (
-                                "Couldn't save the page due to some error; "
-                                "check the logs for details."
-                            )
-                        }
-                    )
-                if saveresult is not None:
-                    stopwatch.stop()
-                    logger.info(
-                        f'Saved page "{targetpage.name}" with summary "{summary}". '
-                        f"Diff ID: {saveresult.get('newrevid')}. Time: {stopwatch}"
+                    }
+                )
+        else:
+            logger.warning(
+                "Skipped page due to error.",
+                extra = {
+                    "head": didntsave_text,
+                    "body": (
+                        "Couldn't save the page due to some error; "
+                        "check the logs for details."
                     )
-                    saveresult_tuple = (sourcepage_name, saveresult, stopwatch)
-                    saveresults.setdefault(wiki, []).append(saveresult_tuple)
+                }
+            )
+    except Exception:
+        logger.exception("Error while saving:")
+        logger.warning(
+            "Skipped page due to error.",
+            extra = {
+                "head": didntsave_text,
+                "body": (
+                    "Couldn't save the page due to some error; "
+                    "check the logs for details."
+                )
+            }
+        )
+    if saveresult is not None:
+        stopwatch.stop()
+        logger.info(
+            f'Saved page "{targetpage.name}" with summary "{summary}". '
+            f"Diff ID: {saveresult.get('newrevid')}. Time: {stopwatch}"
+        )
+        return (sourcepage_name, saveresult, stopwatch)
 
-    logger.info("Completed syncing to all wikis.")
-    Bot.script_output = format_saveresults(saveresults)
+
+@functools.lru_cache(maxsize=None)
+def _summary_for_revid(revid: int):
+    """Return the edit summary for syncing the English revision `revid`.
+
+    The same revision is synced to every wiki, so the summary is cached.
+    """
+    return Bot.summary(f"{SUMMARY_PREFIX}{revid}::")
 
 
 def format_saveresults(saveresults: dict[str, list[tuple[str, dict, Stopwatch]]]):
-    table_total = (
+    table_total_header = (
         "| Wiki | Pages<br/>synced | Pages<br/>changed |\n"
         "| --- | ---: | ---: |\n"
     )
     if len(saveresults) == 0:
-        return table_total
+        return table_total_header
 
+    # the tables are assembled from lists of lines that are joined at the end
+    table_total_rows = []
     details_tables = []
     for wiki, pagesaves in saveresults.items():
+        other_site = Bot.other_sites[wiki]
         pages_synced = len(pagesaves)
         pages_changed = 0
-        details_table = (
-            f"<details><summary><b>{wiki.upper()}</b></summary>\n\n"
-            "| English page | Language wiki page | Diff | Time |\n"
+        details_table_rows = [
+            f"<details><summary><b>{wiki.upper()}</b></summary>\n",
+            "| English page | Language wiki page | Diff | Time |",
             "| --- | --- | --- | --- |"
-        )
+        ]
         for en_pagename, saveresult, stopwatch in pagesaves:
-            nochange = 'newrevid' not in saveresult
-            details_table += (
-                f"\n| [{en_pagename}]({Bot.site.fullurl(title=en_pagename)}) "
-                f"| [{saveresult['title']}]"
-                f"({Bot.other_sites[wiki].fullurl(curid=saveresult['pageid'])}) "
-            )
-            if nochange:
-                details_table += "| [null edit] "
+            if 'newrevid' not in saveresult:
+                diff_cell = "[null edit]"
             else:
                 pages_changed += 1
-                details_table += (
-                    f"| [{saveresult['newrevid']}]"
-                    f"({Bot.other_sites[wiki].fullurl(diff=saveresult['newrevid'])}) "
+                diff_cell = (
+                    f"[{saveresult['newrevid']}]"
+                    f"({other_site.fullurl(diff=saveresult['newrevid'])})"
                 )
-            details_table += f"| {stopwatch} |"
-        details_table += "\n</details>"
-        details_tables.append(details_table)
-        table_total += (
+            details_table_rows.append(
+                f"| [{en_pagename}]({Bot.site.fullurl(title=en_pagename)}) "
+                f"| [{saveresult['title']}]"
+                f"({other_site.fullurl(curid=saveresult['pageid'])}) "
+                f"| {diff_cell} | {stopwatch} |"
+            )
+        details_table_rows.append("</details>")
+        details_tables.append('\n'.join(details_table_rows))
+        table_total_rows.append(
             f"| [`{wiki.upper()}`]"
-            f"({Bot.other_sites[wiki].fullurl(title='Special:Contribs/Ryebot')})"
+            f"({other_site.fullurl(title='Special:Contribs/Ryebot')})"
             f"| {pages_synced} | {pages_changed} |\n"
         )
     return (
         "### Total\n"
-        + table_total
+        + table_total_header
+        + ''.join(table_total_rows)
         + "\n### Details\n"
         + '\n'.join(details_tables)
     )
 
 
 def _validate_wikis_from_config(wikis_from_config: str) -> list[str]:
-    logger.debug("Raw wikis string in config: " + wikis_from_config)
+    logger.debug("Raw wikis string in config: %s", wikis_from_config)
     wikis_from_config = _str_to_set(wikis_from_config)
-    logger.debug(f"Wikis from config parsed as list: {sorted(wikis_from_config)}")
-    # get dynamic if list if possible, this hardcoded list is the fallback
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Wikis from config parsed as list: {sorted(wikis_from_config)}")
+    # get dynamic if list if possible (from the cache if it is recent enough),
+    # this hardcoded list is the fallback
     valid_wikis = {"de", "fr", "hu", "ko", "ru", "pl", "pt", "uk", "zh"}
     is_hardcoded = False
-    try:
-        api_result = Bot.site.get('expandtemplates', text='{{langList|offWiki}}', prop='wikitext')
-        valid_wikis = api_result['expandtemplates']['wikitext']
-    except Exception:
-        is_hardcoded = True
-        logger.exception("Fetching the off-wiki list failed:")
-        logger.info("Using the potentially outdated hardcoded list.")
+    cached_wikis = read_cache('langsync_offwikis', max_age=OFFWIKI_LIST_CACHE_MAX_AGE)
+    if cached_wikis is not None:
+        valid_wikis = _str_to_set(cached_wikis)
+        logger.debug("Using the cached off-wiki list.")
     else:
-        valid_wikis = _str_to_set(valid_wikis)
-    logger.debug("Valid wikis: " + str(sorted(valid_wikis)))
+        try:
+            api_result = Bot.site.get('expandtemplates', text='{{langList|offWiki}}', prop='wikitext')
+            valid_wikis = api_result['expandtemplates']['wikitext']
+        except Exception:
+            logger.exception("Fetching the off-wiki list failed:")
+            cached_wikis = read_cache('langsync_offwikis')
+            if cached_wikis is not None:
+                valid_wikis = _str_to_set(cached_wikis)
+                logger.info("Using the potentially outdated cached list.")
+            else:
+                is_hardcoded = True
+                logger.info("Using the potentially outdated hardcoded list.")
+        else:
+            write_cache('langsync_offwikis', valid_wikis)
+            valid_wikis = _str_to_set(valid_wikis)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Valid wikis: {sorted(valid_wikis)}")
     if not wikis_from_config <= valid_wikis:
         dismissed = str(sorted(wikis_from_config - valid_wikis))
-        logger.debug(f"The following wikis from the config are dismissed: {dismissed}")
+        logger.debug("The following wikis from the config are dismissed: %s", dismissed)
         if is_hardcoded:
             logger.warning(
                 f"Using the hardcoded list and dismissed {len(dismissed)} wikis.",
@@ -358,12 +531,13 @@ def _validate_wikis_from_config(wikis_from_config: str) -> list[str]:
 
 def _get_pages_from_category_cfg(categories_from_config: str):
     """Return data for all pages in all of the categories defined in config."""
-    logger.debug("Raw categories string in config: " + categories_from_config)
+    logger.debug("Raw categories string in config: %s", categories_from_config)
     categories_from_config = _str_to_set(categories_from_config, ';')
-    logger.debug(
-        f"Categories from config parsed as list: ({len(categories_from_config)}) "
-        f"{sorted(categories_from_config)}"
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Categories from config parsed as list: ({len(categories_from_config)}) "
+            f"{sorted(categories_from_config)}"
+        )
     return _get_info_for_categorymembers(categories_from_config)
 
 
@@ -371,8 +545,9 @@ def _get_info_for_categorymembers(categorynames: 'list[str]'):
     """Return page content and revision ID for each member of each category.
 
     Return a dict where the key is the page's ID and the value is another dict
-    with the page name (normalized), current text content, and current revision ID.
-    Ignore non-existent pages and invalid titles.
+    with the page name (normalized), current text content, current revision ID,
+    and SHA-1 hash of the current revision. Ignore non-existent pages and
+    invalid titles.
 
     >>> _get_info_for_titles(['Category:Terraria Wiki'])
     {
@@ -380,6 +555,7 @@ def _get_info_for_categorymembers(categorynames: 'list[str]'):
             'title_en': 'Main Page',
             'text': 'Lorem ipsum',
             'revid': '987654',
+            'sha1': '94912be8b3fb47d4161ea50e5948c6296af6ca05',
             'contentmodel': 'wikitext'
         }
     }
@@ -396,7 +572,7 @@ def _get_info_for_categorymembers(categorynames: 'list[str]'):
             'gcmlimit': 'max',
             'prop': 'revisions',
             'rvslots': 'main',
-            'rvprop': 'ids|content|contentmodel'
+            'rvprop': 'ids|content|contentmodel|sha1'
         }
 
         while True:
@@ -422,29 +598,38 @@ def _get_info_for_categorymembers(categorynames: 'list[str]'):
             'title_en': pagedata['title'],
             'text': pagedata['revisions'][0]['slots']['main']['*'],
             'revid': pagedata['revisions'][0]['revid'],
+            'sha1': pagedata['revisions'][0].get('sha1'),
             'contentmodel': pagedata['revisions'][0]['slots']['main']['contentmodel']
         }
 
     return page_texts_and_ids
 
 
-def _get_pages_from_page_cfg(pages_from_config: str):
-    """Return page info for all pages defined in config, skipping non-existent ones."""
-    logger.debug("Raw pages string in config: " + pages_from_config)
+def _get_pages_from_page_cfg(pages_from_config: str, titles_to_skip: 'set[str] | None' = None):
+    """Return page info for all pages defined in config, skipping non-existent ones.
+
+    Pages in `titles_to_skip` are not fetched again.
+    """
+    titles_to_skip = titles_to_skip or set()
+    logger.debug("Raw pages string in config: %s", pages_from_config)
     pages_from_config = _str_to_set(pages_from_config, ';')
-    logger.debug(
-        f"Pages from config parsed as list: ({len(pages_from_config)}) "
-        f"{sorted(pages_from_config)}"
-    )
-    return _get_info_for_titles(list(pages_from_config))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Pages from config parsed as list: ({len(pages_from_config)}) "
+            f"{sorted(pages_from_config)}"
+        )
+    return _get_info_for_titles(list(pages_from_config - titles_to_skip))
 
 
-def _get_info_for_titles(pagetitles: 'list[str]', site: WikiClient = ''):
+def _get_info_for_titles(pagetitles: 'list[str]', site: WikiClient = '', fetch_text: bool = True):
     """Return page content and revision ID for each page in the `pagetitles`.
 
     Return a dict where the key is the page's ID and the value is another dict
-    with the page name (normalized), current text content, and current revision ID.
-    Ignore non-existent pages and invalid titles.
+    with the page name (normalized), current text content, current revision ID,
+    and SHA-1 hash of the current revision. Ignore non-existent pages and
+    invalid titles. If `fetch_text` is `False`, then omit the text content and
+    content model, which saves transferring the texts if only their hashes are
+    needed.
 
     >>> _get_info_for_titles(['project:foo'])
     {
@@ -452,12 +637,14 @@ def _get_info_for_titles(pagetitles: 'list[str]', site: WikiClient = ''):
             'title_en': 'Terraria Wiki:Foo',
             'text': 'Lorem ipsum',
             'revid': '987654',
+            'sha1': '94912be8b3fb47d4161ea50e5948c6296af6ca05',
             'contentmodel': 'wikitext'
         }
     }
     """
 
     site = site or Bot.site
+    rvprop = 'ids|content|contentmodel|sha1' if fetch_text else 'ids|sha1'
 
     raw_pageinfo = {}
 
@@ -467,10 +654,11 @@ def _get_info_for_titles(pagetitles: 'list[str]', site: WikiClient = ''):
             'titles': '|'.join(titles_slice),
             'prop': 'revisions',
             'rvslots': 'main',
-            'rvprop': 'ids|content|contentmodel'
+            'rvprop': rvprop
         }
 
         while True:
+            limiter_for_host(site.host).acquire()
             api_result = site.api('query', **api_parameters)
             api_result_pagelist: dict = api_result.get('query', {}).get('pages', {})
             # merge the data for each page with the existing data.
@@ -495,24 +683,18 @@ def _get_info_for_titles(pagetitles: 'list[str]', site: WikiClient = ''):
         if int(pageid) > 0:
             page_texts_and_ids[str(pagedata['pageid'])] = {
                 'title_en': pagedata['title'],
-                'text': pagedata['revisions'][0]['slots']['main']['*'],
                 'revid': pagedata['revisions'][0]['revid'],
-                'contentmodel': pagedata['revisions'][0]['slots']['main']['contentmodel']
+                'sha1': pagedata['revisions'][0].get('sha1')
             }
+            if fetch_text:
+                page_texts_and_ids[str(pagedata['pageid'])] |= {
+                    'text': pagedata['revisions'][0]['slots']['main']['*'],
+                    'contentmodel': pagedata['revisions'][0]['slots']['main']['contentmodel']
+                }
 
     return page_texts_and_ids
 
 
-def _pagetitles_to_ids(titles: 'list[str]'):
-    """Return the page IDs of the `titles` and disregard missing pages and invalid titles."""
-    for titles_slice in chunked(titles):
-        api_result = Bot.site.post('query', titles='|'.join(titles_slice))
-        api_result_pagelist: dict = api_result['query']['pages']
-        for pageid in api_result_pagelist.keys():
-            if int(pageid) > 0:
-                yield pageid
-
-
 def _normalize_page_titles(titles: 'list[str]', site: WikiClient = None):
     """Normalize all the `titles`.
 
@@ -533,6 +715,7 @@ def _normalize_page_titles(titles: 'list[str]', site: WikiClient = None):
 
     pagetitles_to_ids = dict.fromkeys(titles, {})
     for titles_slice in chunked(titles):
+        limiter_for_host(site.host).acquire()
         api_result = site.post('query', titles='|'.join(titles_slice))
         # convert the "normalized" list from the API response.
         # original format: [ {'from': 'foo', 'to': 'Foo' } ]
@@ -551,6 +734,29 @@ def _normalize_page_titles(titles: 'list[str]', site: WikiClient = None):
     return pagetitles_to_ids
 
 
+def _get_pages_for_titles(titles: 'list[str]', site: WikiClient):
+    """Return a `Page` object for each of the `titles`, without fetching their texts.
+
+    The info for all pages is fetched in as few API calls as possible, instead
+    of one call per `Page` object. Invalid titles are omitted from the returned
+    dict.
+    """
+    pages_for_titles = {}
+    for titles_slice in chunked(titles):
+        limiter_for_host(site.host).acquire()
+        api_result = site.post('query', titles='|'.join(titles_slice), prop='info', inprop='protection')
+        # see `_normalize_page_titles`
+        normalized = api_result['query'].get('normalized', [])
+        normalized = dict([reversed(norm.values()) for norm in normalized])
+        for pageinfo in api_result['query']['pages'].values():
+            if 'invalid' in pageinfo:
+                continue
+            pagetitle = pageinfo['title']
+            original_title = normalized.get(pagetitle, pagetitle)
+            pages_for_titles[original_title] = Page(site, pagetitle, info=pageinfo)
+    return pages_for_titles
+
+
 def chunked(list_to_chunk, limit_low: int = 50, limit_high = 500):
     """Split the list into equal-sized chunks (sub-lists).
 
@@ -564,6 +770,21 @@ def chunked(list_to_chunk, limit_low: int = 50, limit_high = 500):
         yield list_to_chunk[slicestart:slicestart+limit]
 
 
+def _normalize_title_locally(title: str) -> 'str|None':
+    """Normalize the `title` like MediaWiki would, if that is possible without the wiki.
+
+    Only titles in the main namespace that start with an ASCII character are
+    normalized; return `None` for all other titles. Namespace names and their
+    aliases differ from wiki to wiki, and so does the case folding of the first
+    letter for other characters (e.g. "ß" -> "SS"). Like the English wiki,
+    assumes that the first letter of titles is capitalized (`$wgCapitalLinks`).
+    """
+    title = ' '.join(title.replace('_', ' ').split())
+    if not title or ':' in title or not title[0].isascii():
+        return None
+    return title[:1].upper() + title[1:]
+
+
 def _str_to_set(input_str: str, delimiter: str = ','):
     """Turn the `input_str` into a set.
 
@@ -571,4 +792,10 @@ def _str_to_set(input_str: str, delimiter: str = ','):
     leading whitespace from each one. Discard empty values.
     """
 
-    return set([s.strip() for s in input_str.split(delimiter)]) - {''}
+    return {s for s in _delimiter_pattern(delimiter).split(input_str.strip()) if s}
+
+
+@functools.lru_cache(maxsize=None)
+def _delimiter_pattern(delimiter: str):
+    """Compile a pattern that matches the `delimiter` and its surrounding whitespace."""
+    return re.compile(rf'\s*{re.escape(delimiter)}\s*')
@@ -1,6 +1,7 @@
 import logging
 import random
-import time
+import signal
+import threading
 
 from ryebot.bot import Bot
 from ryebot.login import login
@@ -17,6 +18,8 @@ DEFAULT_CONFIG = {
     "target_page": "User:Rye Greenwood/Sandbox25"
 }
 
+_termination_requested = threading.Event()
+
 
 def script_main():
     logger.info("Started testscript.")
@@ -29,6 +32,20 @@ def script_main():
     logger.info(config)
     logger.info(config.is_default())
 
+    # a SIGTERM ends the sleep between loop iterations immediately instead of
+    # only after it has run its full course
+    _termination_requested.clear()
+    previous_handler = signal.signal(
+        signal.SIGTERM, lambda signum, frame: _termination_requested.set()
+    )
+    try:
+        _edit_loop(config)
+    finally:
+        # `None` means that the handler was not installed from Python
+        signal.signal(signal.SIGTERM, signal.SIG_DFL if previous_handler is None else previous_handler)
+
+
+def _edit_loop(config: ScriptConfiguration):
     summary = Bot.summary('')
     i = -1
     while i < config["limit"] - 1:
@@ -55,7 +72,9 @@ def script_main():
                 f"Diff ID: {saveresult.get('newrevid')}. Time: {stopwatch}"
             )
 
-        # sleep until next loop iteration
+        # sleep until next loop iteration, unless asked to terminate
         logger.info(f"Sleeping for {config['period']} seconds...")
-        time.sleep(config["period"])
+        if _termination_requested.wait(config["period"]):
+            logger.info("Terminated early due to a termination request.")
+            break
         logger.info("Woke up.")
@@ -1,20 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import functools
 import logging
-import time
+import signal
 
 from ryebot.bot import Bot
+from ryebot.disk_cache import delete_cache, read_cache, write_cache
 from ryebot.errors import ScriptRuntimeError
 from ryebot.login import login
+from ryebot.rate_limiter import cancel_waiting, reset_waiting
 from ryebot.stopwatch import Stopwatch
-from ryebot.wiki_util import read_page, save_page
+from ryebot.wiki_util import data_digest, parse_wikitext, read_page, save_page, split_module_text
 
 
 logger = logging.getLogger(__name__)
 
+MAX_PARALLEL_CHUNKS = 8
+# number of chunks that are parsed with one request
+CHUNKS_PER_REQUEST = 4
+# chunks from a failed run are only reused by retries within this time (in seconds)
+CHUNK_CACHE_MAX_AGE = 60 * 60
+# module that generates the chunks; they are only reused for the same revision of it
+DATAGEN_MODULE_NAME = "Module:Iteminfo/datagen"
+
+# lines that separate the data code from the rest of the module
+DATA_START_LINE = "---------------------------------------- DATA START\n"
+DATA_END_LINE = "---------------------------------------- DATA END\n"
+# part of the HTML that Scribunto outputs instead of a module's result on an error
+SCRIBUNTO_ERROR_MARKER = 'class="scribunto-error"'
+
 
 def script_main():
     logger.info("Started update_iteminfo.")
     Bot.site = login()
 
+    # a SIGINT or SIGTERM stops the script as usual, but first ends all waits
+    # for the rate limit immediately (also those in the worker threads)
+    reset_waiting()
+    previous_handlers = {
+        signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+    for signum, previous_handler in previous_handlers.items():
+        signal.signal(signum, functools.partial(_handle_stop_signal, previous_handler))
+    try:
+        _update_modules()
+    finally:
+        for signum, previous_handler in previous_handlers.items():
+            # `None` means that the handler was not installed from Python
+            signal.signal(signum, signal.SIG_DFL if previous_handler is None else previous_handler)
+
+
+def _update_modules():
     summary = Bot.summary("[[User:Ryebot/bot/scripts/iteminfodata|Updated]].")
     intermediate_module_name = "Module:Iteminfo/luadata"
     target_module_name = "Module:Iteminfo/data"
@@ -23,35 +58,82 @@ def script_main():
     number_of_items_per_chunk = 100
 
     # terraria version and generation timestamp
-    module_data_code = _parse_wikitext('{{#invoke:Iteminfo/datagen|genMeta}}') + '\n'
-
-    # pure data code
-    module_data_code += _make_data(lower_itemid, number_of_items_per_chunk) + '\n\n'
-
-    module_page, existing_module_text = read_page(Bot.site, intermediate_module_name)
-    head, body, foot = _get_existing_module_text_parts(module_page, existing_module_text)
+    module_meta_code = _parse_wikitext('{{#invoke:Iteminfo/datagen|genMeta}}')
+    # the item IDs only change with the terraria version, so the meta code
+    # (without the timestamp) identifies the data version
+    data_version = data_digest(module_meta_code).hex()
+
+    # read the existing module while the pure data code is generated, so that
+    # it is ready for the comparison as soon as the last chunk is parsed
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        module_page_future = executor.submit(read_page, Bot.site, intermediate_module_name)
+
+        # pure data code
+        module_code_chunks = _make_data(lower_itemid, number_of_items_per_chunk, data_version)
+        # join all parts at once, since every concatenation would copy the
+        # entire (multiple megabytes long) code again
+        module_data_code = ''.join([module_meta_code, '\n', *module_code_chunks, '\n\n'])
+
+        module_page, existing_module_text = module_page_future.result()
+    head, body, foot = split_module_text(
+        module_page, existing_module_text, DATA_START_LINE, DATA_END_LINE
+    )
 
     # compare the just generated pure data code with the existing pure data code
-    if _no_actual_changes(module_data_code, body):
+    data_changed = not _no_actual_changes(module_data_code, body)
+    if not data_changed and not read_cache('iteminfo_pending_conversion'):
         logger.info(
             "No changes to be made.",
             extra = {"head": "No changes", "body": "The database appears to be up-to-date."}
         )
         return
 
-    new_module_code = head + module_data_code + foot
+    # the target module doesn't depend on the data module, so it is read while
+    # the data module is saved and converted
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        target_module_future = executor.submit(read_page, Bot.site, target_module_name)
+
+        if data_changed:
+            new_module_code = ''.join((head, module_data_code, foot))
+            if not Bot.dry_run:
+                # the target module has to be converted from the new data; remember
+                # that until it is done, in case this run fails before then
+                write_cache('iteminfo_pending_conversion', True)
+            save_page(
+                Bot.site, Bot.dry_run, module_page, new_module_code, summary, minor=True,
+                current_pagetext=existing_module_text
+            )
+        else:
+            logger.info(
+                "No changes to the data, but the target module might not have been "
+                "updated after the last change. Converting it now."
+            )
+
+        module_code_with_json = _parse_wikitext('{{#invoke:Iteminfo/datagen|convertToJsonData}}')
 
-    save_page(Bot.site, Bot.dry_run, module_page, new_module_code, summary, minor=True)
+        target_module, target_module_text = target_module_future.result()
+    target_module_saved = save_page(
+        Bot.site, Bot.dry_run, target_module, module_code_with_json, summary, minor=True,
+        current_pagetext=target_module_text
+    )
+    if target_module_saved:
+        delete_cache('iteminfo_pending_conversion')
 
-    module_code_with_json = _parse_wikitext('{{#invoke:Iteminfo/datagen|convertToJsonData}}')
 
-    target_module, _ = read_page(Bot.site, target_module_name)
-    save_page(Bot.site, Bot.dry_run, target_module, module_code_with_json, summary, minor=True)
+def _handle_stop_signal(previous_handler, signum: int, frame):
+    """Cancel all waits for the rate limit, then stop like the `previous_handler` would."""
+    cancel_waiting()
+    if callable(previous_handler):
+        # e.g. the default SIGINT handler, which raises `KeyboardInterrupt`
+        previous_handler(signum, frame)
+    elif previous_handler != signal.SIG_IGN:
+        # the default action for SIGTERM is to terminate the process
+        raise SystemExit(128 + signum)
 
 
-def _make_data(lower_itemid: int, number_of_items_per_chunk: int):
-    """Run the datagen function for all items and return the result as a string."""
-    max_itemid = _get_max_itemid()
+def _make_data(lower_itemid: int, number_of_items_per_chunk: int, data_version: str):
+    """Run the datagen function for all items and return the resulting chunks of code."""
+    max_itemid = _get_max_itemid(data_version)
     if not max_itemid:
         errorstr = "Couldn't determine the greatest item ID."
         logger.error(
@@ -65,87 +147,116 @@ def _make_data(lower_itemid: int, number_of_items_per_chunk: int):
         f"in chunks of {number_of_items_per_chunk}."
     )
 
-    module_code_chunks = []
-    while lower_itemid <= max_itemid:
-        upper_itemid = min(lower_itemid + number_of_items_per_chunk - 1, max_itemid)
-        module_invocation_code = f"{{{{#invoke:Iteminfo/datagen|gen|{lower_itemid}|{upper_itemid}}}}}"
-        logger.info(module_invocation_code)
-
-        stopwatch = Stopwatch()
-        # create the code for this chunk from the datagen
-        new_module_code_chunk = _parse_wikitext(module_invocation_code)
-        if new_module_code_chunk:
-            stopwatch.stop()
-            logger.info(f"    parsed in {stopwatch}")
-            module_code_chunks.append(new_module_code_chunk)
-        else:
-            errorstr = f'Couldn\'t parse "{module_invocation_code}".'
-            logger.error(
-                errorstr,
-                extra = {
-                    "head": "Parsing a chunk failed",
-                    "body": f'The chunk "{module_invocation_code}" returned no output.'
-                }
+    module_invocation_codes = []
+    for lower in range(lower_itemid, max_itemid + 1, number_of_items_per_chunk):
+        upper = min(lower + number_of_items_per_chunk - 1, max_itemid)
+        module_invocation_codes.append(f"{{{{#invoke:Iteminfo/datagen|gen|{lower}|{upper}}}}}")
+    # several chunks are parsed with one request, to need fewer requests overall
+    batches = {
+        ''.join(module_invocation_codes[i:i + CHUNKS_PER_REQUEST]):
+            module_invocation_codes[i:i + CHUNKS_PER_REQUEST]
+        for i in range(0, len(module_invocation_codes), CHUNKS_PER_REQUEST)
+    }
+
+    # reuse the chunks that a previous, failed run already parsed. the chunks
+    # also depend on the datagen module, which can be edited at any time, so
+    # they are only reused if it is still at the same revision
+    module_code_chunks: dict[str, str] = {}
+    datagen_revid = _get_datagen_revid()
+    chunk_cache_version = f'{data_version}:{datagen_revid}'
+    chunk_cache = read_cache('iteminfo_chunks', max_age=CHUNK_CACHE_MAX_AGE)
+    if (
+        datagen_revid is not None
+        and chunk_cache
+        and chunk_cache.get('chunk_cache_version') == chunk_cache_version
+    ):
+        module_code_chunks = chunk_cache['chunks']
+        logger.info(f"Reusing {len(module_code_chunks)} chunks from a previous run.")
+
+    # the chunks are independent of each other, so they are parsed in parallel;
+    # the rate limiter in _parse_wikitext keeps the requests within budget
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHUNKS) as executor:
+        futures = {
+            batch_code: executor.submit(_make_data_batch, batch)
+            for batch_code, batch in batches.items()
+            if batch_code not in module_code_chunks
+        }
+        try:
+            wait(futures.values())
+        except BaseException:
+            # e.g. a `KeyboardInterrupt`: don't start the batches that are still queued
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    errors = []
+    for batch_code, future in futures.items():
+        try:
+            module_code_chunks[batch_code] = future.result()
+        except Exception as exc:
+            errors.append(exc)
+    if errors:
+        # keep the successfully parsed chunks so that a retry doesn't need to
+        # parse them again
+        if datagen_revid is not None:
+            write_cache(
+                'iteminfo_chunks',
+                {'chunk_cache_version': chunk_cache_version, 'chunks': module_code_chunks}
             )
-            raise ScriptRuntimeError(errorstr)
-
-        # for the next chunk
-        lower_itemid += number_of_items_per_chunk
+        raise errors[0]
+    delete_cache('iteminfo_chunks')
 
-    return ''.join(module_code_chunks)
+    return [module_code_chunks[batch_code] for batch_code in batches]
 
 
-def _get_existing_module_text_parts(module_page, module_text: str):
-    """Return the "head", "body", and "foot" of the existing module.
+def _make_data_batch(module_invocation_codes: 'list[str]'):
+    """Run the datagen function for several chunks of items with one request.
 
-    The module has some other text before and after the data code that needs to
-    be left unchanged. This function splits the existing module code into the part
-    before the data ("head"; the separator is `start_line`) and the part after
-    the data ("foot"; the separator is `end_line`).
+    All invocations in a request share its Lua time limit, so if the combined
+    request fails, each chunk is run with a request of its own instead.
     """
-
-    start_line = "---------------------------------------- DATA START\n"
-    end_line = "---------------------------------------- DATA END\n"
-
-    module_text_lines = module_text.splitlines(keepends=True)
-
-    try:
-        start_line_index = module_text_lines.index(start_line)
-    except ValueError:
-        errorstr = f'Start line {start_line!r} not found in {module_page.name}'
-        logger.error(
-            errorstr,
-            extra = {
-                "head": f"{module_page.name} has an unexpected format",
-                "body": f"Couldn't find the following line in the module text: {start_line!r}"
-            }
-        )
-        raise ScriptRuntimeError(errorstr)
-
-    # .index() likely goes through the lines from the start, which would take
-    # a long time here. we know that the `end_line` is near the end, so we start
-    # from there and go backwards. this should save some time.
-    end_line_index = len(module_text_lines)
-    for line in module_text_lines[::-1]:
-        end_line_index -= 1
-        if line == end_line:
-            break
-    else:
-        errorstr = f"End line {end_line!r} not found in {module_page.name}"
+    if len(module_invocation_codes) > 1:
+        combined_invocation_code = ''.join(module_invocation_codes)
+        logger.info(combined_invocation_code)
+        stopwatch = Stopwatch()
+        try:
+            new_module_code = _parse_wikitext(combined_invocation_code)
+        except ScriptRuntimeError:
+            raise  # waiting was cancelled
+        except Exception:
+            logger.debug("Parsing the chunks with one request failed:", exc_info=True)
+            new_module_code = None
+        if new_module_code and SCRIBUNTO_ERROR_MARKER not in new_module_code:
+            stopwatch.stop()
+            logger.info(f"    {combined_invocation_code} parsed in {stopwatch}")
+            return new_module_code
+        logger.info(f"    {combined_invocation_code} failed, parsing the chunks separately.")
+    return ''.join(_make_data_chunk(code) for code in module_invocation_codes)
+
+
+def _make_data_chunk(module_invocation_code: str):
+    """Run the datagen function with the `module_invocation_code` for one chunk of items."""
+    logger.info(module_invocation_code)
+
+    stopwatch = Stopwatch()
+    # create the code for this chunk from the datagen
+    new_module_code_chunk = _parse_wikitext(module_invocation_code)
+    lua_error = bool(new_module_code_chunk) and SCRIBUNTO_ERROR_MARKER in new_module_code_chunk
+    if not new_module_code_chunk or lua_error:
+        errorstr = f'Couldn\'t parse "{module_invocation_code}".'
         logger.error(
             errorstr,
             extra = {
-                "head": f"{module_page.name} has an unexpected format",
-                "body": f"Couldn't find the following line in the module text: {end_line!r}"
+                "head": "Parsing a chunk failed",
+                "body": (
+                    f'The chunk "{module_invocation_code}" returned a Lua error.' if lua_error
+                    else f'The chunk "{module_invocation_code}" returned no output.'
+                )
             }
         )
         raise ScriptRuntimeError(errorstr)
-
-    return (
-        ''.join(module_text_lines[:start_line_index + 1]),  # head
-        ''.join(module_text_lines[start_line_index + 1:end_line_index]),  # body
-        ''.join(module_text_lines[end_line_index:])  # foot
-    )
+    stopwatch.stop()
+    logger.info(f"    {module_invocation_code} parsed in {stopwatch}")
+    return new_module_code_chunk
 
 
 def _no_actual_changes(new_data_text: str, current_data_text: str):
@@ -156,28 +267,45 @@ def _no_actual_changes(new_data_text: str, current_data_text: str):
     data of the database does not change, so the save can be skipped.
     """
 
-    # strip whitespace from all lines and remove empty lines
-    new_data_lines = [l.strip() for l in new_data_text.splitlines() if l != '']
-    current_data_lines = [l.strip() for l in current_data_text.splitlines() if l != '']
+    if new_data_text == current_data_text:
+        return True
+    return data_digest(new_data_text) == data_digest(current_data_text)
 
-    # ignore the "_generated" line because it contains a timestamp and therefore will always change
-    return (
-        [line for line in new_data_lines if not line.startswith("['_generated']")]
-        == [line for line in current_data_lines if not line.startswith("['_generated']")]
-    )
 
+@functools.lru_cache(maxsize=1)
+def _get_max_itemid(data_version: str):
+    """Return the greatest item ID by expanding {{iteminfo/maxId}}.
+
+    The result is cached on disk for the `data_version`, so it is only expanded
+    again when the data version changes.
+    """
+    cached_max_itemid = read_cache('iteminfo_max_itemid')
+    if cached_max_itemid and cached_max_itemid.get('data_version') == data_version:
+        logger.debug("Using the cached greatest item ID.")
+        return cached_max_itemid['max_itemid']
 
-def _get_max_itemid():
-    """Return the greatest item ID by expanding {{iteminfo/maxId}}."""
     parsed_wikitext = _parse_wikitext("{{iteminfo/maxId}}")
     if parsed_wikitext:
         try:
-            return int(parsed_wikitext)
+            max_itemid = int(parsed_wikitext)
         except ValueError:
             # result is not a valid int
-            pass
+            return None
+        write_cache(
+            'iteminfo_max_itemid',
+            {'data_version': data_version, 'max_itemid': max_itemid}
+        )
+        return max_itemid
+
+
+def _get_datagen_revid():
+    """Return the ID of the current revision of the datagen module, or `None` on error."""
+    try:
+        return Bot.site.pages[DATAGEN_MODULE_NAME].revision
+    except Exception:
+        logger.debug(f'Error while reading "{DATAGEN_MODULE_NAME}":', exc_info=True)
+        return None
 
 
 def _parse_wikitext(wikitext: str):
-    api_result = Bot.site.api("expandtemplates", prop="wikitext", text=wikitext)
-    return api_result.get("expandtemplates", {}).get("wikitext")
+    return parse_wikitext(Bot.site, wikitext)
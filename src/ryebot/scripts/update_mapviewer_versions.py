@@ -1,22 +1,34 @@
+from datetime import datetime, timezone
+import functools
 import logging
-import time
 from typing import NamedTuple
 from urllib.parse import urlparse
 
 import mwparserfromhell
 import requests
+from requests.adapters import HTTPAdapter
 from semantic_version import Version as SemVer
+try:
+    # faster than the json module that `Response.json()` uses
+    import orjson
+except ImportError:
+    orjson = None
 
 from ryebot.bot import Bot
+from ryebot.disk_cache import read_cache, write_cache
 from ryebot.errors import ScriptRuntimeError
-from ryebot.login import login
+from ryebot.login import USER_AGENT, login
 from ryebot.script_configuration import ScriptConfiguration
 from ryebot.stopwatch import Stopwatch
+from ryebot.wiki_util import read_pages
 
 
 logger = logging.getLogger(__name__)
 
 SUMMARY_TIMEFORMAT = "%a, %d %b %Y %H:%M:%S (UTC)"  # timeformat in our edit summaries
+REQUEST_TIMEOUT = (5, 30)  # seconds for connecting and for reading, respectively
+
+_session: requests.Session = None
 
 
 class MapviewerInfo(NamedTuple):
@@ -44,7 +56,10 @@ def script_main():
     config.update_from_wiki()
 
     template_name = config["template"]
-    page, wikitext = _read_page_safely(config["wiki_page"])
+    page, pagetext = _read_page_safely(config["wiki_page"])
+    # parsing the page is expensive, so it is only done once it is needed,
+    # i.e. not at all if no map viewer info can be fetched
+    wikitext: mwparserfromhell.wikicode.Wikicode = None
 
     mapviewers_from_config = filter(
         lambda c: c[0] not in ("template", "wiki_page"),  # reserved parameters
@@ -60,18 +75,18 @@ def script_main():
         if mapviewer_info is None:  # couldn't fetch/parse the most recent version
             continue
 
-        pagetext_preupdate = str(wikitext)
-        wikitext = _update_mapviewer_version_in_wikitext(wikitext, template_name, mapviewer_info)
-        pagetext_postupdate = str(wikitext)
-        if pagetext_preupdate != pagetext_postupdate:  # don't save if there's no change
+        if wikitext is None:
+            wikitext = mwparserfromhell.parse(pagetext)
+        wikitext, changed = _update_mapviewer_version_in_wikitext(wikitext, template_name, mapviewer_info)
+        if changed:  # don't save if there's no change
             _save_page(page, str(wikitext), _assemble_summary(mapviewer_info), mapviewer_info)
 
 
 def _read_page_safely(pagename: str):
-    """Safely get the `Page` object and its `Wikicode` for the `pagename`."""
+    """Safely get the `Page` object and its text for the `pagename`."""
     try:
-        page = Bot.site.pages[pagename]
-        pagetext = page.text()
+        # read the page info and text with one request instead of two
+        page, pagetext = read_pages(Bot.site, [pagename])[pagename]
     except Exception:
         errorstr = f'Reading "{pagename}" failed'
         logger.exception(
@@ -85,7 +100,7 @@ def _read_page_safely(pagename: str):
             }
         )
         raise ScriptRuntimeError(errorstr)
-    return page, mwparserfromhell.parse(pagetext)
+    return page, pagetext
 
 
 def _get_latest_mapviewer_info_from_url(mapviewer_name: str, url: str):
@@ -94,11 +109,58 @@ def _get_latest_mapviewer_info_from_url(mapviewer_name: str, url: str):
     Return a `MapviewerInfo` if this succeeds and `None` if something fails.
     """
 
-    response = requests.get(url)
+    urlparsed = urlparse(url)
+    headers = {}
+    if urlparsed.hostname == "api.github.com":
+        headers['Accept'] = 'application/vnd.github+json'
+
+    # if the response is unchanged since the last run, then the server only
+    # replies with "304 Not Modified" and we can use the info from back then
+    etag_cache: dict = read_cache('mapviewer_etags') or {}
+    cached_response = etag_cache.get(url)
+    if cached_response:
+        headers['If-None-Match'] = cached_response['etag']
+
+    try:
+        response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        logger.exception(f'Error while requesting "{url}":')
+        logger.warning(
+            "Skipped the map viewer because requesting its URL failed.",
+            extra = {
+                "head": f'Did not check "{mapviewer_name}"',
+                "body": (
+                    f'Requesting "{url}" failed due to some error; check the '
+                    "logs for details."
+                )
+            }
+        )
+        return None
+
+    if response.status_code == 304 and cached_response:
+        logger.info("Unchanged since the last check, using the version info from then.")
+        return MapviewerInfo(
+            mapviewer_name,
+            cached_response['new_version_raw'],
+            SemVer(cached_response['new_version']),
+            cached_response['url'],
+            cached_response['date']
+        )
+
     if response.ok:
-        urlparsed = urlparse(url)
         if urlparsed.hostname == "api.github.com":
-            return _parse_response_github(response, mapviewer_name)
+            mapviewer_info = _parse_response_github(response, mapviewer_name)
+            etag = response.headers.get('ETag')
+            if mapviewer_info is not None and etag:
+                etag_cache[url] = {
+                    'etag': etag,
+                    'new_version_raw': mapviewer_info.new_version_raw,
+                    'new_version': str(mapviewer_info.new_version),
+                    'url': mapviewer_info.url,
+                    'date': mapviewer_info.date
+                }
+                write_cache('mapviewer_etags', etag_cache)
+            return mapviewer_info
         # there's only the GitHub parser function at the moment; more to be added as follows:
         # elif urlparsed.hostname == "foo.bar.com":  # or other condition
         #     return _parse_response_foobar(response, mapviewer_name)
@@ -117,9 +179,26 @@ def _get_latest_mapviewer_info_from_url(mapviewer_name: str, url: str):
     return None
 
 
+def get_session():
+    """Return the `requests.Session` that is used for all map viewer URLs.
+
+    All requests go through the same session so that the connection to a host
+    (most often api.github.com) is reused between map viewers.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers['User-Agent'] = USER_AGENT
+        _session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=10))
+    return _session
+
+
 def _parse_response_github(response: requests.Response, mapviewer_name: str):
     """Parse the response of a GitHub API call for a repository's release."""
-    repo_info = response.json()
+    if orjson is not None:
+        repo_info = orjson.loads(response.content)
+    else:
+        repo_info = response.json()
     tag_name: str|None = repo_info.get('tag_name')
     html_url: str|None = repo_info.get('html_url')
     published_at: str|None = repo_info.get('published_at')
@@ -130,7 +209,7 @@ def _parse_response_github(response: requests.Response, mapviewer_name: str):
         tag_name = tag_name.removeprefix('v').removeprefix('V')
     # convert to semver Version
     try:
-        tag_name_as_version_object = SemVer.coerce(tag_name or '')
+        tag_name_as_version_object = _coerce(tag_name or '')
     except ValueError:
         logger.exception(f'Couldn\'t parse the version string from GitHub ("{tag_name}"):')
         logger.warning(
@@ -147,12 +226,10 @@ def _parse_response_github(response: requests.Response, mapviewer_name: str):
 
     # convert the "published_at" timestamp to another format
     if published_at:
-        github_timeformat = "%Y-%m-%dT%H:%M:%SZ"  # timeformat of GitHub API results
-        try:
-            published_at_as_struct = time.strptime(published_at, github_timeformat)
-            published_at = time.strftime(SUMMARY_TIMEFORMAT, published_at_as_struct)
-        except ValueError:  # parsing failed, leave it at the original format
-            pass
+        published_at_as_datetime = _parse_github_timestamp(published_at)
+        if published_at_as_datetime is not None:
+            published_at = published_at_as_datetime.strftime(SUMMARY_TIMEFORMAT)
+        # otherwise parsing failed, leave it at the original format
 
     return MapviewerInfo(
         mapviewer_name,
@@ -163,20 +240,63 @@ def _parse_response_github(response: requests.Response, mapviewer_name: str):
     )
 
 
+def _parse_github_timestamp(timestamp: str) -> 'datetime|None':
+    """Convert the GitHub API `timestamp` to a `datetime`, or return `None` if that fails.
+
+    The timestamps always have the format "YYYY-MM-DDTHH:MM:SSZ", so they are
+    parsed by hand, which is much quicker than `strptime`.
+    """
+    # the separators are at every third position, starting at index 4
+    if len(timestamp) != 20 or timestamp[4::3] != '--T::Z':
+        return None
+    try:
+        return datetime(
+            int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]),
+            int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19]),
+            tzinfo=timezone.utc
+        )
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=256)
+def _coerce(version_string: str) -> SemVer:
+    """Convert the `version_string` to a `SemVer`. Raises `ValueError` if that fails.
+
+    The same version strings recur often (e.g. the current version on the wiki
+    and the most recent version from the source), so the results are cached.
+    """
+    return SemVer.coerce(version_string)
+
+
 def _update_mapviewer_version_in_wikitext(
     wikitext: mwparserfromhell.wikicode.Wikicode,
     template_name: str,
     mapviewer_info: MapviewerInfo
 ):
-    """Modify the map viewer version in the `wikitext` and return it."""
-    # extract the {{software infobox}} template for this map viewer
+    """Modify the map viewer version in the `wikitext`.
+
+    Return the `wikitext` and whether it was changed.
+    """
+    # extract the {{software infobox}} template for this map viewer.
+    # `Wikicode.matches()` would parse the compared string again for each
+    # template, so both names are normalized only once here instead
+    wanted_template_name = _normalize_name(template_name)
+    wanted_mapviewer_name = _normalize_name(mapviewer_info.name)
     mapviewer_template_object: mwparserfromhell.nodes.Template = None
+    version_parameter: mwparserfromhell.nodes.extras.Parameter = None
     for template in wikitext.ifilter_templates():
+        if _normalize_name(template.name.strip_code()) != wanted_template_name:
+            continue
+        # look up both parameters in a single pass over the parameter list;
+        # like `Template.get()`, the last one wins if a parameter is repeated
+        parameters = {str(p.name).strip(): p for p in template.params}
+        name_parameter = parameters.get('name')
+        version_parameter = parameters.get('version')
         if (
-            template.name.matches(template_name)
-            and template.has('name')
-            and template.get('name').value.matches(mapviewer_info.name)
-            and template.has('version')
+            name_parameter is not None
+            and version_parameter is not None
+            and _normalize_name(name_parameter.value.strip_code()) == wanted_mapviewer_name
         ):
             mapviewer_template_object = template
             break
@@ -191,14 +311,22 @@ def _update_mapviewer_version_in_wikitext(
                 )
             }
         )
-        return wikitext
+        return wikitext, False
 
-    logger.info(f"Parameter currently: {mapviewer_template_object.get('version')}")
+    logger.info(f"Parameter currently: {version_parameter}")
+
+    template_value_string = str(version_parameter.value).strip()
+    # nothing to compare if the version is exactly the same (the most common case)
+    if template_value_string == mapviewer_info.new_version_raw:
+        logger.info(
+            f"Skipped the map viewer because the version {template_value_string} is current.",
+            extra = {"head": f'"{mapviewer_info.name}" version is up to date'}
+        )
+        return wikitext, False
 
     # parse the current parameter value as a SemanticVersion object
-    template_value_string = str(mapviewer_template_object.get("version").value).strip()
     try:
-        current_version = SemVer.coerce(template_value_string)
+        current_version = _coerce(template_value_string)
     except ValueError:
         logger.exception(f"Couldn't parse this version string:")
         logger.warning(
@@ -211,11 +339,12 @@ def _update_mapviewer_version_in_wikitext(
                 )
             }
         )
-        return wikitext
+        return wikitext, False
 
     logger.info(f"Current version: {current_version}")
     logger.info(f"New version: {mapviewer_info.new_version}")
 
+    changed = False
     if mapviewer_info.new_version <= current_version:
         logger.info(
             (
@@ -228,8 +357,21 @@ def _update_mapviewer_version_in_wikitext(
     else:
         # update the parameter
         mapviewer_template_object.add("version", mapviewer_info.new_version_raw)
+        changed = True
         logger.info(f"Parameter after replacement: {mapviewer_template_object.get('version')}")
-    return wikitext
+    return wikitext, changed
+
+
+def _normalize_name(name: str):
+    """Normalize the `name` for comparison, in the same way as `Wikicode.matches()`.
+
+    Surrounding whitespace is removed, the first letter is capitalized, and
+    underscores are treated as spaces.
+    """
+    name = name.strip()
+    if not name:
+        return name
+    return (name[0].upper() + name[1:]).replace('_', ' ')
 
 
 def _save_page(page, wikitext: str, summary: str, mapviewer_info: MapviewerInfo):
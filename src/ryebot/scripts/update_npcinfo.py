@@ -1,14 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import time
 
 from ryebot.bot import Bot
+from ryebot.disk_cache import read_cache, write_cache
 from ryebot.errors import ScriptRuntimeError
 from ryebot.login import login
 from ryebot.stopwatch import Stopwatch
+from ryebot.wiki_util import data_digest, parse_wikitext, split_module_text
 
 
 logger = logging.getLogger(__name__)
 
+MAX_PARALLEL_CHUNKS = 4
+
+DATA_START_LINE = "---------------------------------------- DATA START\n"
+DATA_END_LINE = "---------------------------------------- DATA END\n"
+
+# part of the HTML that Scribunto outputs instead of a module's result on an error
+SCRIBUNTO_ERROR_MARKER = 'class="scribunto-error"'
+
+# parts of the Scribunto error messages for a module that exceeded the time or
+# memory limit; only these errors can be fixed by parsing smaller chunks
+SCRIBUNTO_LIMIT_ERROR_MARKERS = ('The time allocated for running scripts has expired', 'not enough memory')
+
+# how often a chunk can be split in half (i.e. at most 2**n parts of it)
+MAX_CHUNK_SPLIT_DEPTH = 3
+
 
 def script_main():
     logger.info("Started update_npcinfo.")
@@ -17,16 +35,23 @@ def script_main():
     summary = Bot.summary("[[User:Ryebot/bot/scripts/npcinfodata|Updated]].")
     target_module_name = "Module:Npcinfo/data"
 
-    number_of_npcs_per_chunk = 100
+    # chunks that exceed the Lua limits of one request are split automatically
+    number_of_npcs_per_chunk = 250
 
     # terraria version and generation timestamp
-    module_data_code = _parse_wikitext('{{#invoke:Npcinfo/datagen|genMeta}}') + '\n'
+    module_meta_code = _parse_wikitext('{{#invoke:Npcinfo/datagen|genMeta}}')
+    module_data_code = module_meta_code + '\n'
+    # the NPC IDs only change with the terraria version, so the meta code
+    # (without the timestamp) identifies the data version
+    data_version = data_digest(module_meta_code).hex()
 
     # pure data code
-    module_data_code += _make_data(number_of_npcs_per_chunk) + '\n\n'
+    module_data_code += _make_data(number_of_npcs_per_chunk, data_version) + '\n\n'
 
     module_page = _get_page_safely(target_module_name)
-    head, body, foot = _get_existing_module_text_parts(module_page)
+    head, body, foot = split_module_text(
+        module_page, module_page.text(), DATA_START_LINE, DATA_END_LINE
+    )
 
     # compare the just generated pure data code with the existing pure data code
     if _no_actual_changes(module_data_code, body):
@@ -69,9 +94,9 @@ def script_main():
             )
 
 
-def _make_data(number_of_npcs_per_chunk: int):
+def _make_data(number_of_npcs_per_chunk: int, data_version: str):
     """Run the datagen function for all NPCs and return the result as a string."""
-    min_npcid = _get_min_npcid()
+    min_npcid, max_npcid = _get_npcid_range(data_version)
     if not min_npcid:
         errorstr = "Couldn't determine the lowest NPC ID."
         logger.error(
@@ -80,7 +105,6 @@ def _make_data(number_of_npcs_per_chunk: int):
         )
         raise ScriptRuntimeError(errorstr)
 
-    max_npcid = _get_max_npcid()
     if not max_npcid:
         errorstr = "Couldn't determine the greatest NPC ID."
         logger.error(
@@ -94,89 +118,65 @@ def _make_data(number_of_npcs_per_chunk: int):
         f"in chunks of {number_of_npcs_per_chunk}."
     )
 
-    module_code_chunks = []
-    lower_npcid = min_npcid
-    while lower_npcid <= max_npcid:
-        upper_npcid = min(lower_npcid + number_of_npcs_per_chunk - 1, max_npcid)
-        module_invocation_code = f"{{{{#invoke:Npcinfo/datagen|gen|{lower_npcid}|{upper_npcid}}}}}"
-        logger.info(module_invocation_code)
-
-        stopwatch = Stopwatch()
-        # create the code for this chunk from the datagen
-        new_module_code_chunk = _parse_wikitext(module_invocation_code)
-        if new_module_code_chunk:
-            stopwatch.stop()
-            logger.info(f"    parsed in {stopwatch}")
-            module_code_chunks.append(new_module_code_chunk)
-        else:
-            errorstr = f'Couldn\'t parse "{module_invocation_code}".'
-            logger.error(
-                errorstr,
-                extra = {
-                    "head": "Parsing a chunk failed",
-                    "body": f'The chunk "{module_invocation_code}" returned no output.'
-                }
-            )
-            raise ScriptRuntimeError(errorstr)
-
-        # for the next chunk
-        lower_npcid += number_of_npcs_per_chunk
+    lower_npcids = range(min_npcid, max_npcid + 1, number_of_npcs_per_chunk)
+    upper_npcids = [
+        min(lower + number_of_npcs_per_chunk - 1, max_npcid) for lower in lower_npcids
+    ]
+    # the chunks are independent of each other, so they are parsed in parallel;
+    # the rate limiter in parse_wikitext keeps the requests within budget.
+    # map() returns the results in the order of the chunks
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHUNKS) as executor:
+        module_code_chunks = list(executor.map(_make_data_chunk, lower_npcids, upper_npcids))
 
     return ''.join(module_code_chunks)
 
 
-def _get_existing_module_text_parts(module_page):
-    """Return the "head", "body", and "foot" of the existing module.
+def _make_data_chunk(lower_npcid: int, upper_npcid: int, split_depth: int = 0):
+    """Run the datagen function for the NPCs from `lower_npcid` through `upper_npcid`.
 
-    The module has some other text before and after the data code that needs to
-    be left unchanged. This function splits the existing module code into the part
-    before the data ("head"; the separator is `start_line`) and the part after
-    the data ("foot"; the separator is `end_line`).
+    If the chunk exceeds the Lua time or memory limit of one request, then it
+    is split in two halves, which are parsed separately (at most
+    `MAX_CHUNK_SPLIT_DEPTH` times in a row). Other errors are not caused by the
+    size of the chunk, so they end the script right away.
     """
-
-    start_line = "---------------------------------------- DATA START\n"
-    end_line = "---------------------------------------- DATA END\n"
-
-    module_text: str = module_page.text()
-    module_text_lines = module_text.splitlines(keepends=True)
-
-    try:
-        start_line_index = module_text_lines.index(start_line)
-    except ValueError:
-        errorstr = f'Start line {start_line!r} not found in {module_page.name}'
-        logger.error(
-            errorstr,
-            extra = {
-                "head": f"{module_page.name} has an unexpected format",
-                "body": f"Couldn't find the following line in the module text: {start_line!r}"
-            }
+    module_invocation_code = f"{{{{#invoke:Npcinfo/datagen|gen|{lower_npcid}|{upper_npcid}}}}}"
+    logger.info(module_invocation_code)
+
+    stopwatch = Stopwatch()
+    # create the code for this chunk from the datagen
+    new_module_code_chunk = _parse_wikitext(module_invocation_code)
+    lua_error = bool(new_module_code_chunk) and SCRIBUNTO_ERROR_MARKER in new_module_code_chunk
+
+    if (
+        lua_error
+        and any(marker in new_module_code_chunk for marker in SCRIBUNTO_LIMIT_ERROR_MARKERS)
+        and lower_npcid < upper_npcid
+        and split_depth < MAX_CHUNK_SPLIT_DEPTH
+    ):
+        middle_npcid = (lower_npcid + upper_npcid) // 2
+        logger.info(f"    exceeded the Lua limits, splitting it at {middle_npcid}")
+        return (
+            _make_data_chunk(lower_npcid, middle_npcid, split_depth + 1)
+            + _make_data_chunk(middle_npcid + 1, upper_npcid, split_depth + 1)
         )
-        raise ScriptRuntimeError(errorstr)
 
-    # .index() likely goes through the lines from the start, which would take
-    # a long time here. we know that the `end_line` is near the end, so we start
-    # from there and go backwards. this should save some time.
-    end_line_index = len(module_text_lines)
-    for line in module_text_lines[::-1]:
-        end_line_index -= 1
-        if line == end_line:
-            break
-    else:
-        errorstr = f"End line {end_line!r} not found in {module_page.name}"
-        logger.error(
-            errorstr,
-            extra = {
-                "head": f"{module_page.name} has an unexpected format",
-                "body": f"Couldn't find the following line in the module text: {end_line!r}"
-            }
-        )
-        raise ScriptRuntimeError(errorstr)
-
-    return (
-        ''.join(module_text_lines[:start_line_index + 1]),  # head
-        ''.join(module_text_lines[start_line_index + 1:end_line_index]),  # body
-        ''.join(module_text_lines[end_line_index:])  # foot
+    if new_module_code_chunk and not lua_error:
+        stopwatch.stop()
+        logger.info(f"    parsed in {stopwatch}")
+        return new_module_code_chunk
+
+    errorstr = f'Couldn\'t parse "{module_invocation_code}".'
+    logger.error(
+        errorstr,
+        extra = {
+            "head": "Parsing a chunk failed",
+            "body": (
+                f'The chunk "{module_invocation_code}" returned a Lua error.' if lua_error
+                else f'The chunk "{module_invocation_code}" returned no output.'
+            )
+        }
     )
+    raise ScriptRuntimeError(errorstr)
 
 
 def _no_actual_changes(new_data_text: str, current_data_text: str):
@@ -187,15 +187,30 @@ def _no_actual_changes(new_data_text: str, current_data_text: str):
     data of the database does not change, so the save can be skipped.
     """
 
-    # strip whitespace from all lines and remove empty lines
-    new_data_lines = [l.strip() for l in new_data_text.splitlines() if l != '']
-    current_data_lines = [l.strip() for l in current_data_text.splitlines() if l != '']
+    if new_data_text == current_data_text:
+        return True
+    return data_digest(new_data_text) == data_digest(current_data_text)
 
-    # ignore the "_generated" line because it contains a timestamp and therefore will always change
-    return (
-        [line for line in new_data_lines if not line.startswith("['_generated']")]
-        == [line for line in current_data_lines if not line.startswith("['_generated']")]
-    )
+
+def _get_npcid_range(data_version: str):
+    """Return the lowest and the greatest NPC ID.
+
+    The IDs are cached on disk for the `data_version`, so they are only
+    expanded again when the data version changes.
+    """
+    cached_range = read_cache('npcinfo_npcid_range')
+    if cached_range and cached_range.get('data_version') == data_version:
+        logger.debug("Using the cached NPC ID range.")
+        return cached_range['min_npcid'], cached_range['max_npcid']
+
+    min_npcid = _get_min_npcid()
+    max_npcid = _get_max_npcid()
+    if min_npcid and max_npcid:
+        write_cache(
+            'npcinfo_npcid_range',
+            {'data_version': data_version, 'min_npcid': min_npcid, 'max_npcid': max_npcid}
+        )
+    return min_npcid, max_npcid
 
 
 def _get_max_npcid():
@@ -221,8 +236,7 @@ def _get_min_npcid():
 
 
 def _parse_wikitext(wikitext: str):
-    api_result = Bot.site.api("expandtemplates", prop="wikitext", text=wikitext)
-    return api_result.get("expandtemplates", {}).get("wikitext")
+    return parse_wikitext(Bot.site, wikitext)
 
 
 def _get_page_safely(pagename: str):
@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
+import time
 
 from ryebot.errors import StopwatchError
 
@@ -18,7 +19,7 @@ class Stopwatch():
 
     def __init__(self, start_now: bool = True):
         """Create a new stopwatch that immediately starts running, unless `start_now` is `False`."""
-        self._start_time: datetime = None
+        self._start_time: int = None  # in nanoseconds, from an arbitrary reference point
         self.time: timedelta = None
         if start_now:
             self.start()
@@ -27,16 +28,22 @@ class Stopwatch():
         """Start measuring time. Raises `StopwatchError` if already running."""
         if self._start_time is not None:
             raise StopwatchError(running=True)
-        self._start_time = datetime.now(tz=timezone.utc)
+        # the monotonic clock is unaffected by system clock adjustments
+        self._start_time = time.monotonic_ns()
 
     def stop(self):
         """Stop measuring time and return it. Raises `StopwatchError` if not currently running."""
-        end_time = datetime.now(tz=timezone.utc)  # calling this as early as possible
+        end_time = time.monotonic_ns()  # calling this as early as possible
         if self._start_time is None:
             raise StopwatchError(running=False)
-        self.time = end_time - self._start_time
+        self.time = timedelta(microseconds=(end_time - self._start_time) // 1000)
         self._start_time = None
         return self.time
 
+    def restart(self):
+        """Discard the current measurement, if any, and start measuring time anew."""
+        self._start_time = None
+        self.start()
+
     def __str__(self):
         return str(self.time)
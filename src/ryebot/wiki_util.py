@@ -1,15 +1,39 @@
+import hashlib
+import io
 import logging
+import time
 
 from custom_mwclient import WikiClient
 from mwclient.errors import InsufficientPermission, InvalidPageTitle, ProtectedPageError
 from mwclient.page import Page
+from mwclient.util import parse_timestamp
 
+from ryebot.rate_limiter import limiter_for_host, retry_with_backoff
 from ryebot.stopwatch import Stopwatch
 from ryebot.errors import ScriptRuntimeError
 
 
 logger = logging.getLogger(__name__)
 
+# beginning of the line with the generation timestamp in the data code of the
+# data modules (e.g. Module:Iteminfo/data)
+GENERATED_LINE_PREFIX = "['_generated']"
+
+
+@retry_with_backoff()
+def parse_wikitext(site: WikiClient, wikitext: str) -> 'str|None':
+    """Expand the templates in the `wikitext` and return the result.
+
+    The request goes through the site's session and with that through the
+    connection pool shared by all sites (see `login`).
+    """
+    # stay within the request budget of the wiki.gg servers
+    limiter_for_host(site.host).acquire()
+    # formatversion 2 returns non-ASCII characters as they are instead of as
+    # "\uXXXX" escapes, which makes large responses smaller
+    api_result = site.api("expandtemplates", prop="wikitext", text=wikitext, formatversion=2)
+    return api_result.get("expandtemplates", {}).get("wikitext")
+
 
 def read_page(site: WikiClient, pagename: str) -> 'tuple[Page, str]':
     """Safely get the `Page` object and its text for the `pagename`."""
@@ -52,20 +76,141 @@ def read_page(site: WikiClient, pagename: str) -> 'tuple[Page, str]':
     return page, pagetext
 
 
-def save_page(site: WikiClient, dry_run: bool, page: Page, pagetext: str, summary: str, minor: bool = True, loglevel: int = logging.INFO):
-    """Save the `Page` object with the new `pagetext` and `summary`."""
-    if dry_run:
+def read_pages(site: WikiClient, pagenames: 'list[str]') -> 'dict[str, tuple[Page, str]]':
+    """Get the `Page` object and its text for each of the (at most 50) `pagenames`.
+
+    Unlike `read_page`, which needs two API calls per page, this needs only one
+    API call for all pages. The keys of the returned dict are the `pagenames`
+    as given; invalid titles are omitted, and nonexistent pages have an empty
+    text. Like with `read_page`, the pages carry the timestamps that mwclient
+    uses for edit conflict detection when saving them. Errors are not handled here.
+    """
+    api_result = site.post(
+        'query',
+        titles='|'.join(pagenames),
+        prop='info|revisions',
+        inprop='protection',
+        rvprop='content|timestamp',
+        rvslots='main'
+    )
+    # map the normalized titles back to the ones that were given
+    normalized = {
+        normalization['to']: normalization['from']
+        for normalization in api_result['query'].get('normalized', [])
+    }
+    pages = {}
+    for pageinfo in api_result['query']['pages'].values():
+        if 'invalid' in pageinfo:
+            continue
+        pagetitle = pageinfo['title']
+        page = Page(site, pagetitle, info=pageinfo)
+        revisions = pageinfo.get('revisions')
+        if revisions:
+            pagetext = revisions[0]['slots']['main']['*']
+            # what `Page.text()` would set; mwclient sends these as the "basetimestamp"
+            # and "starttimestamp" of the edit, otherwise edits made in the meantime
+            # would be overwritten silently
+            page.last_rev_time = parse_timestamp(revisions[0]['timestamp'])
+        else:
+            pagetext = ''
+        page.edit_time = time.gmtime()
+        pages[normalized.get(pagetitle, pagetitle)] = (page, pagetext)
+    return pages
+
+
+def split_module_text(page: Page, text: str, start_line: str, end_line: str) -> 'tuple[str, str, str]':
+    """Split the `text` of the module `page` into "head", "body", and "foot".
+
+    The "head" is everything up to and including the first `start_line`, the
+    "foot" is everything from the last `end_line` on, and the "body" is the
+    text between them. Both separators have to be whole lines, including the
+    newline. Raise a `ScriptRuntimeError` if either of them is missing.
+    """
+    # the separators have to be whole lines, so they either are at the very
+    # start of the text or follow a newline
+    if text.startswith(start_line):
+        body_start = len(start_line)
+    else:
+        start_line_index = text.find('\n' + start_line)
+        if start_line_index == -1:
+            errorstr = f'Start line {start_line!r} not found in {page.name}'
+            logger.error(
+                errorstr,
+                extra = {
+                    "head": f"{page.name} has an unexpected format",
+                    "body": f"Couldn't find the following line in the module text: {start_line!r}"
+                }
+            )
+            raise ScriptRuntimeError(errorstr)
+        body_start = start_line_index + 1 + len(start_line)
+
+    # we know that the `end_line` is near the end, so we search backwards from
+    # there (but not before the newline that ends the `start_line`)
+    end_line_index = text.rfind('\n' + end_line, body_start - 1)
+    if end_line_index == -1:
+        errorstr = f"End line {end_line!r} not found in {page.name}"
+        logger.error(
+            errorstr,
+            extra = {
+                "head": f"{page.name} has an unexpected format",
+                "body": f"Couldn't find the following line in the module text: {end_line!r}"
+            }
+        )
+        raise ScriptRuntimeError(errorstr)
+    body_end = end_line_index + 1
+
+    return (
+        text[:body_start],  # head
+        text[body_start:body_end],  # body
+        text[body_end:]  # foot
+    )
+
+
+def data_digest(data_text: str) -> bytes:
+    """Return a hash of the data in the `data_text`, ignoring whitespace changes.
+
+    Whitespace around lines, empty lines, and the "_generated" line (it contains
+    a timestamp and therefore will always change) do not affect the hash.
+    """
+    data_hash = hashlib.blake2b(digest_size=16)
+    # iterating over a StringIO yields the lines one by one, whereas
+    # splitlines() would first create a list of all lines
+    for line in io.StringIO(data_text):
+        line = line.strip()
+        if line and not line.startswith(GENERATED_LINE_PREFIX):
+            data_hash.update(line.encode())
+            data_hash.update(b'\n')
+    return data_hash.digest()
+
+
+def save_page(site: WikiClient, dry_run: bool, page: Page, pagetext: str, summary: str, minor: bool = True, loglevel: int = logging.INFO, current_pagetext: str = None):
+    """Save the `Page` object with the new `pagetext` and `summary`.
+
+    If the `current_pagetext` of the page is given and equal to the `pagetext`,
+    then the save is skipped. Return `True` if the page has the `pagetext` now
+    (i.e. it was saved or didn't need to be), and `False` otherwise.
+    """
+    if current_pagetext is not None and pagetext == current_pagetext:
+        logger.log(loglevel, f'Page "{page.name}" is already up-to-date, skipped saving it.')
+        return True
+    elif dry_run:
         chardiff_str = f"{len(pagetext) - (page.length or 0):+} diff"
         logger.log(
             loglevel,
             f'Would save page "{page.name}" ({len(pagetext)} characters, '
             f'{chardiff_str}) with summary "{summary}".'
         )
+        return False
     else:
         warningstr = f'Did not save the page "{page.name}"'
         stopwatch = Stopwatch()
         try:
-            saveresult = site.save(page, pagetext, summary, minor)
+            # the md5 hash lets the server verify that the text arrived intact;
+            # the base timestamp for edit conflict detection is added by mwclient
+            saveresult = retry_with_backoff()(site.save)(
+                page, pagetext, summary, minor,
+                md5=hashlib.md5(pagetext.encode()).hexdigest()
+            )
         except ProtectedPageError as exc:
             if exc.code:
                 logstr = (
@@ -79,6 +224,7 @@ def save_page(site: WikiClient, dry_run: bool, page: Page, pagetext: str, summar
             else:
                 bodystr = "Couldn't save the page because it is protected."
             logger.warning(logstr, extra={"head": warningstr, "body": bodystr})
+            return False
         except Exception:
             logger.exception("Error while saving:")
             logger.warning(
@@ -91,6 +237,7 @@ def save_page(site: WikiClient, dry_run: bool, page: Page, pagetext: str, summar
                     )
                 }
             )
+            return False
         else:
             stopwatch.stop()
             diff_id = saveresult.get("newrevid")
@@ -100,3 +247,4 @@ def save_page(site: WikiClient, dry_run: bool, page: Page, pagetext: str, summar
                 f'Saved page "{page.name}" with summary "{summary}". '
                 f"Diff: {diff_link}. Time: {stopwatch}"
             )
+            return True